@@ -1,15 +1,308 @@
-from typing import Dict, List, Optional
+from typing import Any, Dict, List, Literal, Optional, Type
+import asyncio
+import gzip
+import hashlib
 import openai
 import json
-import yaml
+import orjson
+import os
+import threading
+import tiktoken
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+from pydantic import BaseModel, ConfigDict, ValidationError
+from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_random_exponential
+
+# Transient errors worth retrying with backoff (timeouts subclass APIConnectionError)
+RETRYABLE_OPENAI_ERRORS = (
+    openai.RateLimitError,
+    openai.APIConnectionError,
+    openai.InternalServerError
+)
+
+SYSTEM_PROMPT = "You are an expert security analyst. Analyze the security alert and provide concise, actionable insights."
+
+SIGNAL_DETAILS_TEMPLATE = """Alert Details:
+- Rule Name: {rule_name}
+- Severity: {severity}
+- Risk Score: {risk_score}
+- Description: {description}
+- Timestamp: {timestamp}
+
+Process Information:
+- Name: {process_name}
+- Command Line: {process_command_line}
+- Working Directory: {process_working_directory}
+- Parent Process: {parent_name}
+- Parent Command Line: {parent_command_line}
+
+User Context:
+- Username: {user_name}
+- Domain: {user_domain}
+
+Host Information:
+- Hostname: {hostname}
+- OS: {os_name}
+
+MITRE ATT&CK:
+{threat}
+"""
+
+ANALYSIS_INSTRUCTIONS = """Please provide:
+1. Severity Assessment (Critical/High/Medium/Low) with short explanation
+2. Short description of the rule and its purpose
+3. Short summary of host and user context in a table
+4. Detailed analysis of the alert with highlighting key fields and explaining what that key data mean (like explaining process with arguments, files and registry)
+5. Recommended immediate actions
+"""
+
+PROMPT_TEMPLATE = (
+    "Analyze the following security alert and provide a triage assessment:\n\n"
+    + SIGNAL_DETAILS_TEMPLATE
+    + "\n"
+    + ANALYSIS_INSTRUCTIONS
+    + "\nRespond with JSON matching the provided schema. Markdown may be used inside the analysis text.\n"
+)
+
+# Batch API statuses after which a batch will not progress any further
+BATCH_TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+# Batch API limits per input file
+BATCH_MAX_REQUESTS = 50000
+BATCH_MAX_BYTES = 200 * 1024 * 1024
+
+BATCH_SYSTEM_PROMPT = "You are an expert security analyst. Analyze each security alert independently and provide concise, actionable insights."
+
+BATCH_RESPONSE_INSTRUCTIONS = (
+    "Respond with JSON matching the provided schema, with exactly one entry in results per alert "
+    "and signal_id set to the id given in the alert heading.\n"
+)
+
+class ContextRow(BaseModel):
+    """One row of the host and user context table."""
+    model_config = ConfigDict(extra='forbid')
+
+    field: str
+    value: str
+
+class TriageOutput(BaseModel):
+    """Structured triage assessment returned by the AI model for one signal."""
+    model_config = ConfigDict(extra='forbid')
+
+    severity: Literal['Critical', 'High', 'Medium', 'Low']
+    severity_reason: str
+    rule_summary: str
+    host_user_context: List[ContextRow]
+    analysis: str
+    actions: List[str]
+
+    def to_markdown(self) -> str:
+        """Render the assessment as markdown for a Kibana note."""
+        # Escape pipes so cell values cannot break the table layout
+        rows = "\n".join(
+            "| " + row.field.replace("|", "\\|") + " | " + row.value.replace("|", "\\|") + " |"
+            for row in self.host_user_context
+        )
+        actions = "\n".join(f"- {action}" for action in self.actions)
+        return (
+            f"## Severity: {self.severity}\n{self.severity_reason}\n\n"
+            f"## Rule Summary\n{self.rule_summary}\n\n"
+            f"## Host and User Context\n| Field | Value |\n|---|---|\n{rows}\n\n"
+            f"## Analysis\n{self.analysis}\n\n"
+            f"## Recommended Actions\n{actions}\n"
+        )
+
+class SignalTriage(BaseModel):
+    """Triage assessment of one signal within a multi-signal response."""
+    model_config = ConfigDict(extra='forbid')
+
+    signal_id: str
+    triage: TriageOutput
+
+class BatchTriageOutput(BaseModel):
+    """Structured response to a prompt packing several signals."""
+    model_config = ConfigDict(extra='forbid')
+
+    results: List[SignalTriage]
+
+def _json_schema_format(name: str, model: type) -> Dict:
+    """Build a strict json_schema response_format from a Pydantic model."""
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": name,
+            "strict": True,
+            "schema": model.model_json_schema()
+        }
+    }
+
+TRIAGE_RESPONSE_FORMAT = _json_schema_format("triage_output", TriageOutput)
+BATCH_TRIAGE_RESPONSE_FORMAT = _json_schema_format("batch_triage_output", BatchTriageOutput)
+
+# Template placeholders and the dotted signal source paths they are read from
+# (keep in sync with SIGNAL_SOURCE_FIELDS in connectors/elasticsearch.py)
+PROMPT_FIELDS = {
+    'rule_name': 'kibana.alert.rule.name',
+    'severity': 'kibana.alert.rule.parameters.severity',
+    'risk_score': 'kibana.alert.rule.parameters.risk_score',
+    'description': 'kibana.alert.rule.parameters.description',
+    'timestamp': '@timestamp',
+    'process_name': 'process.name',
+    'process_command_line': 'process.command_line',
+    'process_working_directory': 'process.working_directory',
+    'parent_name': 'process.parent.name',
+    'parent_command_line': 'process.parent.command_line',
+    'user_name': 'user.name',
+    'user_domain': 'user.domain',
+    'hostname': 'host.hostname',
+    'os_name': 'host.os.name'
+}
+
+def _deep_get(data: Dict, path: str, default: Any = None) -> Any:
+    """
+    Look up a dotted path in nested dictionaries.
+    
+    Args:
+        data: Dictionary to search
+        path: Dotted key path (e.g., 'host.os.name')
+        default: Value returned when any key along the path is missing
+    """
+    for key in path.split('.'):
+        if not isinstance(data, dict) or key not in data:
+            return default
+        data = data[key]
+    return data
+
+def signal_fingerprint(signal: Dict, bucket_minutes: int = 15) -> Optional[tuple]:
+    """
+    Fingerprint the underlying activity of a signal for deduplication.
+    
+    Signals from the same rule, host, command line and user within the
+    same time bucket produce the same fingerprint, whose last element is
+    the bucket. Signals without a command line (e.g. authentication or
+    network alerts) differ in fields the fingerprint does not cover, so
+    they get None and are never grouped.
+    
+    Args:
+        signal: Security signal dictionary from Elasticsearch
+        bucket_minutes: Width of the time bucket in minutes (default: 15)
+    """
+    source = signal.get('source', {})
+    command_line = _deep_get(source, 'process.command_line')
+    if not command_line:
+        return None
+    timestamp = source.get('@timestamp', '')
+    try:
+        parsed = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+        bucket = int(parsed.timestamp() // (bucket_minutes * 60))
+    except (AttributeError, ValueError):
+        # Unparseable timestamps only match signals with the exact same value
+        bucket = timestamp
+    return (
+        _deep_get(source, 'kibana.alert.rule.uuid') or _deep_get(source, 'kibana.alert.rule.name'),
+        _deep_get(source, 'host.hostname'),
+        command_line,
+        _deep_get(source, 'user.name'),
+        bucket
+    )
+
+def _get_prompt_fields(signal: Dict) -> Dict:
+    """
+    Resolve the template fields of a signal into a flat mapping.
+    
+    Args:
+        signal: Security signal dictionary containing alert details
+    """
+    source = signal.get('source', {})
+    threat = _deep_get(source, 'kibana.alert.rule.parameters.threat', [])
+    
+    # Resolve every field once into a flat mapping for the template
+    fields = {
+        name: _deep_get(source, path, 'N/A')
+        for name, path in PROMPT_FIELDS.items()
+    }
+    fields['threat'] = json.dumps(threat, indent=2)
+    return fields
+
+def _create_signal_prompt(signal: Dict) -> str:
+    """
+    Create a prompt for the AI model based on the signal data.
+    
+    Module-level so it can be pickled and run in a worker process.
+    
+    Args:
+        signal: Security signal dictionary containing alert details
+    """
+    return PROMPT_TEMPLATE.format_map(_get_prompt_fields(signal))
+
+class TokenBucketLimiter:
+    def __init__(self, capacity: int, period: float = 60.0):
+        """
+        Initialize a token bucket that refills `capacity` tokens every `period` seconds.
+        
+        Args:
+            capacity: Maximum number of tokens available per period
+            period: Refill period in seconds (default: 60)
+        """
+        self.capacity = capacity
+        self.rate = capacity / period
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = None
+
+    def _refill(self) -> None:
+        """Add the tokens accrued since the last update, capped at capacity."""
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, amount: int = 1) -> None:
+        """
+        Wait until `amount` tokens are available and take them.
+        
+        Args:
+            amount: Number of tokens to take (capped at capacity)
+        """
+        amount = min(amount, self.capacity)
+        # Created lazily so the lock binds to the running event loop
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            self._refill()
+            while self._tokens < amount:
+                await asyncio.sleep((amount - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= amount
+
+    def refund(self, amount: int) -> None:
+        """
+        Return unused tokens to the bucket.
+        
+        Args:
+            amount: Number of tokens to give back
+        """
+        self._refill()
+        self._tokens = min(self.capacity, self._tokens + amount)
 
 class AISecurityAnalyst:
     def __init__(
         self,
         openai_api_key: str,
         model: str = "gpt-4o",
-        temperature: float = 0.3
+        temperature: float = 0.3,
+        max_tokens: int = 2048,
+        max_output_tokens: int = 16384,
+        requests_per_minute: int = 500,
+        tokens_per_minute: int = 30000,
+        cache_dir: Optional[str] = "cache",
+        memory_cache_size: int = 1024,
+        prompt_workers: Optional[int] = 0,
+        log_sample_rate: int = 10,
+        log_max_bytes: int = 100 * 1024 * 1024,
+        log_backups: int = 5,
+        log_flush_every: int = 100
     ):
         """
         Initialize AI Security Analyst with OpenAI credentials.
@@ -18,81 +311,283 @@ class AISecurityAnalyst:
             openai_api_key: OpenAI API key
             model: OpenAI model to use (default: gpt-4)
             temperature: Model temperature (default: 0.3)
+            max_tokens: Maximum completion tokens per response (default: 2048)
+            max_output_tokens: Model's completion token limit, caps multi-signal requests (default: 16384)
+            requests_per_minute: Account RPM limit to stay under (default: 500)
+            tokens_per_minute: Account TPM limit to stay under (default: 30000)
+            cache_dir: Directory for cached responses, None to disable (default: 'cache')
+            memory_cache_size: Number of responses kept in memory for this run (default: 1024)
+            prompt_workers: Processes building prompts, None for CPU count (default: 0, build inline)
+            log_sample_rate: Log the full signal and prompt for 1 in N signals (default: 10)
+            log_max_bytes: Compressed log size that triggers rotation (default: 100 MiB)
+            log_backups: Number of rotated logs to keep (default: 5)
+            log_flush_every: Entries buffered per gzip member written to disk (default: 100)
         """
-        self.client = openai.OpenAI(api_key=openai_api_key)
+        # Retries are handled by tenacity in _create_completion
+        self.client = openai.AsyncOpenAI(api_key=openai_api_key, max_retries=0)
         self.model = model
         self.temperature = temperature
-        self.log_file = "logs.txt"
+        self.max_tokens = max_tokens
+        self.max_output_tokens = max_output_tokens
+        self.log_file = "logs.ndjson.gz"
+        self.log_sample_rate = max(1, log_sample_rate)
+        self.log_max_bytes = log_max_bytes
+        self.log_backups = log_backups
+        self.log_flush_every = max(1, log_flush_every)
+        self._logged_signals = 0
+        # Entries are written as complete gzip members, so a hard kill loses at
+        # most one unwritten member and never leaves a stream without a trailer
+        self._log_lock = threading.Lock()
+        self._log_buffer = []
+        self._open_log()
+        
+        # Smooth bursts to the account ceiling instead of hitting 429s
+        self.rpm_limiter = TokenBucketLimiter(requests_per_minute)
+        self.tpm_limiter = TokenBucketLimiter(tokens_per_minute)
+        try:
+            self.encoding = tiktoken.encoding_for_model(model)
+        except KeyError:
+            self.encoding = tiktoken.get_encoding("o200k_base")
+        
+        # Responses keyed by (model, temperature, prompt) so reruns skip the API
+        self.cache_dir = cache_dir
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+        # Submitted Batch API jobs, so an interrupted run can collect them instead of paying twice
+        self.batches_file = os.path.join(cache_dir, "batches.json") if cache_dir else None
+        self.memory_cache_size = memory_cache_size
+        self._memory_cache = OrderedDict()
+        
+        # Off by default: pickling a signal to a worker costs more than formatting it
+        self._prompt_pool = (
+            ProcessPoolExecutor(max_workers=prompt_workers)
+            if prompt_workers != 0
+            else None
+        )
 
-    def _create_signal_prompt(self, signal: Dict) -> str:
+    async def _build_signal_prompt(self, signal: Dict) -> str:
         """
-        Create a prompt for the AI model based on the signal data.
+        Build a signal prompt in the process pool, keeping CPU work off the event loop.
         
         Args:
             signal: Security signal dictionary containing alert details
         """
-        # Extract process details from source
-        process = signal.get('source', {}).get('process', {})
-        parent_process = process.get('parent', {})
-        
-        # Extract alert details from source.kibana.alert
-        kibana_alert = signal.get('source', {}).get('kibana', {}).get('alert', {})
-        rule_params = kibana_alert.get('rule', {}).get('parameters', {})
-        
-        # Get host info from source
-        host = signal.get('source', {}).get('host', {})
-        
-        # Get user info from source
-        user = signal.get('source', {}).get('user', {})
-        
-        return f"""Analyze the following security alert and provide a triage assessment:
-
-        Alert Details:
-        - Rule Name: {kibana_alert.get('rule', {}).get('name', 'N/A')}
-        - Severity: {rule_params.get('severity', 'N/A')}
-        - Risk Score: {rule_params.get('risk_score', 'N/A')}
-        - Description: {rule_params.get('description', 'N/A')}
-        - Timestamp: {signal.get('source', {}).get('@timestamp', 'N/A')}
-
-        Process Information:
-        - Name: {process.get('name', 'N/A')}
-        - Command Line: {process.get('command_line', 'N/A')}
-        - Working Directory: {process.get('working_directory', 'N/A')}
-        - Parent Process: {parent_process.get('name', 'N/A')}
-        - Parent Command Line: {parent_process.get('command_line', 'N/A')}
+        if self._prompt_pool is None:
+            return _create_signal_prompt(signal)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._prompt_pool, _create_signal_prompt, signal)
 
-        User Context:
-        - Username: {user.get('name', 'N/A')}
-        - Domain: {user.get('domain', 'N/A')}
+    def _create_batch_prompt(self, signals: List[Dict], details: List[str]) -> str:
+        """
+        Create a single prompt asking for a JSON triage of several signals.
+        
+        Args:
+            signals: Security signal dictionaries in the batch
+            details: Rendered alert details for each signal, in the same order
+        """
+        sections = [
+            f"## Alert {index} (signal_id={signal['id']})\n{detail}"
+            for index, (signal, detail) in enumerate(zip(signals, details), start=1)
+        ]
+        return (
+            f"Analyze each of the following {len(signals)} security alerts and provide a triage assessment for each one.\n\n"
+            + "\n".join(sections)
+            + "\nFor each alert, " + ANALYSIS_INSTRUCTIONS[0].lower() + ANALYSIS_INSTRUCTIONS[1:]
+            + "\n" + BATCH_RESPONSE_INSTRUCTIONS
+        )
 
-        Host Information:
-        - Hostname: {host.get('hostname', 'N/A')}
-        - OS: {host.get('os', {}).get('name', 'N/A')}
+    def _open_log(self) -> None:
+        """Open the gzip debug log for appending, rotating it first if it is too large."""
+        if os.path.exists(self.log_file) and os.path.getsize(self.log_file) >= self.log_max_bytes:
+            self._rotate_log()
+        self._log_fh = open(self.log_file, 'ab', buffering=0)
 
-        MITRE ATT&CK:
-        {yaml.dump(rule_params.get('threat', []), default_flow_style=False)}
+    def _flush_log(self) -> None:
+        """Append the buffered entries as one gzip member, rotating the log if it grew too large."""
+        if not self._log_buffer:
+            return
+        self._log_fh.write(gzip.compress(b"".join(self._log_buffer), compresslevel=6))
+        self._log_buffer.clear()
+        if self._log_fh.tell() >= self.log_max_bytes:
+            self._log_fh.close()
+            self._open_log()
 
-        Please provide:
-        1. Severity Assessment (Critical/High/Medium/Low) with short explanation
-        2. Short description of the rule and its purpose
-        3. Short summary of host and user context in a table
-        4. Detailed analysis of the alert with highlighting key fields and explaining what that key data mean (like explaining process with arguments, files and registry)
-        5. Recommended immediate actions
+    def _close_log(self) -> None:
+        """Write any buffered entries and close the log file."""
+        self._flush_log()
+        self._log_fh.close()
 
-        Use markdown formatting for the response.
-        """
+    def _rotate_log(self) -> None:
+        """Shift logs.ndjson.gz to logs.ndjson.gz.1 and so on, dropping the oldest."""
+        for index in range(self.log_backups - 1, 0, -1):
+            source = f"{self.log_file}.{index}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.log_file}.{index + 1}")
+        if self.log_backups > 0:
+            os.replace(self.log_file, f"{self.log_file}.1")
+        else:
+            os.remove(self.log_file)
 
     def _log_debug(self, message: str, data: any) -> None:
-        """Log debug information to file in NDJSON format."""
+        """Log debug information to the gzip file in NDJSON format."""
+        # Epoch seconds from time_ns(), avoiding datetime formatting on the hot path
+        ts = time.time_ns()
         log_entry = {
-            "timestamp": datetime.now().isoformat(),
+            "timestamp": f"{ts // 1_000_000_000}.{ts % 1_000_000_000:09d}",
             "message": message,
             "data": data
         }
-        with open(self.log_file, 'a') as f:
-            f.write(json.dumps(log_entry) + "\n")
+        line = orjson.dumps(log_entry, default=str, option=orjson.OPT_APPEND_NEWLINE)
+        with self._log_lock:
+            self._log_buffer.append(line)
+            if len(self._log_buffer) >= self.log_flush_every:
+                self._flush_log()
+
+    def close(self) -> None:
+        """Shut down the prompt workers, then flush and close the debug log."""
+        if self._prompt_pool is not None:
+            self._prompt_pool.shutdown()
+        with self._log_lock:
+            if not self._log_fh.closed:
+                self._close_log()
+
+    def _cache_key(self, prompt: str) -> str:
+        """Return the SHA256 fingerprint of the model, temperature and prompt."""
+        return hashlib.sha256((self.model + str(self.temperature) + prompt).encode()).hexdigest()
 
-    def analyze_signal(self, signal: Dict) -> Dict:
+    def _remember(self, key: str, analysis: str) -> None:
+        """Store an analysis in the in-memory LRU cache."""
+        self._memory_cache[key] = analysis
+        self._memory_cache.move_to_end(key)
+        if len(self._memory_cache) > self.memory_cache_size:
+            self._memory_cache.popitem(last=False)
+
+    def _read_cache_file(self, key: str) -> Optional[str]:
+        """Return the cached analysis for a key, or None on a miss."""
+        path = os.path.join(self.cache_dir, f"{key}.json")
+        try:
+            with open(path) as f:
+                return json.load(f)['choices'][0]['message']['content']
+        except (FileNotFoundError, json.JSONDecodeError, KeyError, IndexError):
+            return None
+
+    def _write_cache_file(self, key: str, response: Dict) -> None:
+        """Atomically write a response to the on-disk cache."""
+        path = os.path.join(self.cache_dir, f"{key}.json")
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(response, f)
+        os.replace(tmp_path, path)
+
+    async def _get_cached(self, key: str) -> Optional[str]:
+        """Look up an analysis in memory, then on disk without blocking the event loop."""
+        if key in self._memory_cache:
+            self._memory_cache.move_to_end(key)
+            return self._memory_cache[key]
+        if not self.cache_dir:
+            return None
+        loop = asyncio.get_running_loop()
+        analysis = await loop.run_in_executor(None, self._read_cache_file, key)
+        if analysis is not None:
+            self._remember(key, analysis)
+        return analysis
+
+    async def _set_cached(self, key: str, response: Dict) -> None:
+        """Store a response in memory and on disk."""
+        self._remember(key, response['choices'][0]['message']['content'])
+        if self.cache_dir:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, self._write_cache_file, key, response)
+
+    @retry(
+        wait=wait_random_exponential(min=1, max=60),
+        stop=stop_after_attempt(5),
+        retry=retry_if_exception_type(RETRYABLE_OPENAI_ERRORS),
+        reraise=True
+    )
+    async def _create_completion(
+        self,
+        prompt: str,
+        system_prompt: str = SYSTEM_PROMPT,
+        max_tokens: Optional[int] = None,
+        **kwargs
+    ):
+        """
+        Send a prompt to the chat completions API, retrying transient failures.
+        
+        Args:
+            prompt: User prompt to send alongside the system prompt
+            system_prompt: System prompt to send (default: SYSTEM_PROMPT)
+            max_tokens: Completion token budget (default: self.max_tokens)
+            **kwargs: Extra arguments for chat.completions.create (e.g., response_format)
+        """
+        max_tokens = max_tokens or self.max_tokens
+        
+        # Reserve prompt tokens plus the full completion budget, refund the unused part
+        estimated_tokens = (
+            len(self.encoding.encode(system_prompt))
+            + len(self.encoding.encode(prompt))
+            + max_tokens
+        )
+        await self.rpm_limiter.acquire()
+        await self.tpm_limiter.acquire(estimated_tokens)
+        try:
+            response = await self.client.chat.completions.create(
+                model=self.model,
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=self.temperature,
+                max_tokens=max_tokens,
+                **kwargs
+            )
+        except Exception:
+            self.tpm_limiter.refund(estimated_tokens)
+            raise
+        if response.usage:
+            self.tpm_limiter.refund(max(0, estimated_tokens - response.usage.total_tokens))
+        return response
+
+    async def _complete(self, prompt: str, output_model: Type[BaseModel], **kwargs) -> BaseModel:
+        """
+        Return the model's answer to a prompt, reusing a cached answer when available.
+        
+        Only complete answers that validate are cached, so a truncated or
+        malformed response is retried on the next run rather than replayed.
+        
+        Args:
+            prompt: User prompt to send
+            output_model: Pydantic model the answer must validate against
+            **kwargs: Extra arguments for _create_completion
+        
+        Raises:
+            ValidationError: If the model's answer does not match `output_model`
+        """
+        key = self._cache_key(prompt)
+        content = await self._get_cached(key)
+        if content is not None:
+            try:
+                output = output_model.model_validate_json(content)
+            except ValidationError:
+                self._log_debug("Invalid Cache Entry:", key)
+            else:
+                self._log_debug("Cache Hit:", key)
+                return output
+        
+        response = await self._create_completion(prompt, **kwargs)
+        response_data = response.model_dump(exclude={'choices': {'__all__': {'logprobs'}}})
+
+        # Log the AI response
+        self._log_debug("AI Response:", response_data)
+        
+        choice = response.choices[0]
+        output = output_model.model_validate_json(choice.message.content or "")
+        if choice.finish_reason == "stop":
+            await self._set_cached(key, response_data)
+        return output
+
+    async def analyze_signal(self, signal: Dict) -> Dict:
         """
         Analyze a security signal using the AI model.
         
@@ -100,29 +595,345 @@ class AISecurityAnalyst:
             signal: Security signal dictionary from Elasticsearch
         
         Returns:
-            Dictionary containing AI analysis results
+            Dictionary containing AI analysis results, with the assessment as a TriageOutput
         """
-        prompt = self._create_signal_prompt(signal)
+        prompt = await self._build_signal_prompt(signal)
         
-        # Log the input signal and prompt
-        self._log_debug("Input Signal:", signal)
-        self._log_debug("Generated Prompt:", prompt)
+        # Log the full input signal and prompt for a sample of signals only
+        self._logged_signals += 1
+        if (self._logged_signals - 1) % self.log_sample_rate == 0:
+            self._log_debug("Input Signal:", signal)
+            self._log_debug("Generated Prompt:", prompt)
+        else:
+            self._log_debug("Input Signal ID:", signal["id"])
         
-        response = self.client.chat.completions.create(
-            model=self.model,
-            messages=[
-                {"role": "system", "content": "You are an expert security analyst. Analyze the security alert and provide concise, actionable insights."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=self.temperature
-        )
-
-        # Log the AI response
-        self._log_debug("AI Response:", response.model_dump())
+        triage = await self._complete(prompt, TriageOutput, response_format=TRIAGE_RESPONSE_FORMAT)
         
         return {
             "signal_id": signal["id"],
-            "analysis": response.choices[0].message.content,
+            "triage": triage,
             "model_used": self.model,
             "timestamp": signal["source"].get("@timestamp")
-        }
\ No newline at end of file
+        }
+
+    async def _analyze_batch(self, signals: List[Dict], details: List[str]) -> List[Dict]:
+        """
+        Analyze one batch of signals with a single request.
+        
+        Signals missing from the model's answer are analyzed individually.
+        
+        Args:
+            signals: Security signal dictionaries in the batch
+            details: Rendered alert details for each signal, in the same order
+        """
+        if len(signals) == 1:
+            return await self._analyze_individually(signals)
+        
+        prompt = self._create_batch_prompt(signals, details)
+        self._log_debug("Generated Batch Prompt:", prompt)
+        
+        try:
+            output = await self._complete(
+                prompt,
+                BatchTriageOutput,
+                system_prompt=BATCH_SYSTEM_PROMPT,
+                max_tokens=min(self.max_tokens * len(signals), self.max_output_tokens),
+                response_format=BATCH_TRIAGE_RESPONSE_FORMAT
+            )
+            analyses = {item.signal_id: item.triage for item in output.results}
+        except ValidationError as e:
+            self._log_debug("Invalid Batch Response:", str(e))
+            analyses = {}
+        
+        missing = [signal for signal in signals if signal['id'] not in analyses]
+        fallback = dict(zip(
+            [signal['id'] for signal in missing],
+            await self._analyze_individually(missing)
+        ))
+        
+        return [
+            fallback[signal['id']] if signal['id'] in fallback else {
+                "signal_id": signal["id"],
+                "triage": analyses[signal['id']],
+                "model_used": self.model,
+                "timestamp": signal["source"].get("@timestamp")
+            }
+            for signal in signals
+        ]
+
+    async def _analyze_individually(self, signals: List[Dict]) -> List:
+        """
+        Analyze signals one request each, concurrently.
+        
+        Args:
+            signals: Security signal dictionaries from Elasticsearch
+        
+        Returns:
+            AI analysis results in the same order as `signals`, or the exception raised for a signal
+        """
+        return await asyncio.gather(
+            *[self.analyze_signal(signal) for signal in signals],
+            return_exceptions=True
+        )
+
+    async def analyze_signals_batch(
+        self,
+        signals: List[Dict],
+        batch_size: int = 5,
+        max_batch_tokens: int = 8000
+    ) -> List[Dict]:
+        """
+        Analyze several security signals, packing up to `batch_size` into each request.
+        
+        Sharing the system prompt and instructions across a batch cuts
+        both requests and prompt tokens per signal. Batches are closed
+        early when their alert details would exceed `max_batch_tokens`,
+        and never hold more signals than fit in `max_output_tokens`.
+        Signals of a failed batch are analyzed individually.
+        
+        Args:
+            signals: Security signal dictionaries from Elasticsearch
+            batch_size: Maximum number of signals per request (default: 5)
+            max_batch_tokens: Maximum alert detail tokens per request (default: 8000)
+        
+        Returns:
+            List of AI analysis results in the same order as `signals`; a
+            signal that could not be analyzed has the raised exception instead
+        """
+        # Each signal needs a full completion budget within the model's output limit
+        batch_size = max(1, min(batch_size, self.max_output_tokens // self.max_tokens))
+        
+        batches = []
+        batch, details, batch_tokens = [], [], 0
+        for signal in signals:
+            detail = SIGNAL_DETAILS_TEMPLATE.format_map(_get_prompt_fields(signal))
+            tokens = len(self.encoding.encode(detail))
+            if batch and (len(batch) >= batch_size or batch_tokens + tokens > max_batch_tokens):
+                batches.append((batch, details))
+                batch, details, batch_tokens = [], [], 0
+            batch.append(signal)
+            details.append(detail)
+            batch_tokens += tokens
+        if batch:
+            batches.append((batch, details))
+        
+        batch_results = await asyncio.gather(
+            *[self._analyze_batch(batch, details) for batch, details in batches],
+            return_exceptions=True
+        )
+        
+        # Keep completed batches and retry the signals of failed ones individually
+        failed = [
+            signal
+            for (batch, _), batch_result in zip(batches, batch_results)
+            if isinstance(batch_result, Exception)
+            for signal in batch
+        ]
+        fallback = dict(zip(
+            [signal['id'] for signal in failed],
+            await self._analyze_individually(failed)
+        ))
+        
+        results = []
+        for (batch, _), batch_result in zip(batches, batch_results):
+            if isinstance(batch_result, Exception):
+                self._log_debug("Failed Batch Request:", str(batch_result))
+                batch_result = [fallback[signal['id']] for signal in batch]
+            results.extend(batch_result)
+        return results
+
+    def _build_batch_request(self, signal: Dict) -> Dict:
+        """
+        Build one Batch API request line for a signal.
+        
+        Args:
+            signal: Security signal dictionary from Elasticsearch
+        """
+        return {
+            "custom_id": signal["id"],
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": {
+                "model": self.model,
+                "messages": [
+                    {"role": "system", "content": SYSTEM_PROMPT},
+                    {"role": "user", "content": _create_signal_prompt(signal)}
+                ],
+                "temperature": self.temperature,
+                "max_tokens": self.max_tokens,
+                "response_format": TRIAGE_RESPONSE_FORMAT
+            }
+        }
+
+    async def get_cached_analyses(self, signals: List[Dict]) -> Dict[str, Dict]:
+        """
+        Look up signals in the response cache without calling the API.
+        
+        Args:
+            signals: Security signal dictionaries from Elasticsearch
+        
+        Returns:
+            Dictionary mapping signal IDs to AI analysis results for cache hits
+        """
+        results = {}
+        for signal in signals:
+            content = await self._get_cached(self._cache_key(_create_signal_prompt(signal)))
+            if content is None:
+                continue
+            try:
+                triage = TriageOutput.model_validate_json(content)
+            except ValidationError:
+                continue
+            results[signal["id"]] = {
+                "signal_id": signal["id"],
+                "triage": triage,
+                "model_used": self.model,
+                "timestamp": signal["source"].get("@timestamp")
+            }
+        return results
+
+    def get_open_batches(self) -> Dict[str, List[str]]:
+        """
+        Return batches submitted by earlier runs whose results were not collected yet.
+        
+        Returns:
+            Dictionary mapping batch IDs to the IDs of the signals submitted in them
+        """
+        if not self.batches_file:
+            return {}
+        try:
+            with open(self.batches_file) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _save_open_batches(self, batches: Dict[str, List[str]]) -> None:
+        """Atomically write the open batches to disk."""
+        if not self.batches_file:
+            return
+        tmp_path = f"{self.batches_file}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(batches, f)
+        os.replace(tmp_path, self.batches_file)
+
+    async def submit_batch(self, signals: List[Dict]) -> List[str]:
+        """
+        Submit signals to the OpenAI Batch API for offline analysis.
+        
+        Batch requests are cheaper and not subject to the live rate
+        limits, at the cost of completing within a 24 hour window.
+        Signals are split over several batches to stay within the
+        per-file request and size limits.
+        
+        Args:
+            signals: Security signal dictionaries from Elasticsearch
+        
+        Returns:
+            IDs of the created batches
+        """
+        chunks = []
+        chunk, chunk_bytes = [], 0
+        for signal in signals:
+            line = (json.dumps(self._build_batch_request(signal)) + "\n").encode()
+            if chunk and (len(chunk) >= BATCH_MAX_REQUESTS or chunk_bytes + len(line) > BATCH_MAX_BYTES):
+                chunks.append(chunk)
+                chunk, chunk_bytes = [], 0
+            chunk.append((signal["id"], line))
+            chunk_bytes += len(line)
+        if chunk:
+            chunks.append(chunk)
+        
+        batch_ids = []
+        open_batches = self.get_open_batches()
+        for index, chunk in enumerate(chunks, start=1):
+            batch_file = await self.client.files.create(
+                file=(f"signals-{index}.jsonl", b"".join(line for _, line in chunk)),
+                purpose="batch"
+            )
+            batch = await self.client.batches.create(
+                input_file_id=batch_file.id,
+                endpoint="/v1/chat/completions",
+                completion_window="24h"
+            )
+            self._log_debug("Submitted Batch:", batch.model_dump())
+            batch_ids.append(batch.id)
+            # Record each batch as soon as it exists so it survives an interruption
+            open_batches[batch.id] = [signal_id for signal_id, _ in chunk]
+            self._save_open_batches(open_batches)
+        return batch_ids
+
+    async def wait_for_batch(self, batch_id: str, poll_interval: float = 60.0):
+        """
+        Poll a batch until it reaches a terminal status.
+        
+        Args:
+            batch_id: One of the IDs returned by submit_batch
+            poll_interval: Seconds between status checks (default: 60)
+        
+        Returns:
+            The final batch object
+        """
+        while True:
+            batch = await self.client.batches.retrieve(batch_id)
+            if batch.status in BATCH_TERMINAL_STATUSES:
+                self._log_debug("Finished Batch:", batch.model_dump())
+                return batch
+            await asyncio.sleep(poll_interval)
+
+    async def get_batch_results(self, batch, signals: List[Dict]) -> Dict[str, Dict]:
+        """
+        Download the output of a finished batch and cache each response.
+        
+        The batch is then no longer reported by get_open_batches.
+        
+        Args:
+            batch: Batch object returned by wait_for_batch
+            signals: Security signal dictionaries submitted in the batch
+        
+        Returns:
+            Dictionary mapping signal IDs to AI analysis results; failed requests are omitted
+        """
+        results = await self._collect_batch_results(batch, signals)
+        open_batches = self.get_open_batches()
+        if open_batches.pop(batch.id, None) is not None:
+            self._save_open_batches(open_batches)
+        return results
+
+    async def _collect_batch_results(self, batch, signals: List[Dict]) -> Dict[str, Dict]:
+        """Download, validate and cache the responses of a finished batch."""
+        if not batch.output_file_id:
+            return {}
+        
+        signals_by_id = {signal["id"]: signal for signal in signals}
+        output = await self.client.files.content(batch.output_file_id)
+        
+        results = {}
+        for line in output.text.splitlines():
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            signal = signals_by_id.get(item["custom_id"])
+            response = item.get("response") or {}
+            if signal is None or response.get("status_code") != 200:
+                self._log_debug("Failed Batch Request:", item)
+                continue
+            
+            response_data = response["body"]
+            self._log_debug("AI Response:", response_data)
+            choice = response_data["choices"][0]
+            try:
+                triage = TriageOutput.model_validate_json(choice["message"]["content"] or "")
+            except ValidationError as e:
+                self._log_debug("Invalid Batch Response:", str(e))
+                continue
+            
+            # Cache complete answers under the same key as a live call so reruns skip these signals
+            if choice.get("finish_reason") == "stop":
+                await self._set_cached(self._cache_key(_create_signal_prompt(signal)), response_data)
+            results[signal["id"]] = {
+                "signal_id": signal["id"],
+                "triage": triage,
+                "model_used": self.model,
+                "timestamp": signal["source"].get("@timestamp")
+            }
+        return results
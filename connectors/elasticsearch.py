@@ -1,7 +1,59 @@
-from elasticsearch import Elasticsearch
-from typing import Dict, List, Optional
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from elasticsearch import ApiError, AsyncElasticsearch, Elasticsearch, NotFoundError
+from typing import AsyncIterator, Dict, List, Optional
 from datetime import datetime, timedelta
 
+# Signal source fields read when building AI prompts and deduplicating; everything else is left on the server
+SIGNAL_SOURCE_FIELDS = [
+    '@timestamp',
+    'process.name',
+    'process.command_line',
+    'process.working_directory',
+    'process.parent.name',
+    'process.parent.command_line',
+    'user.name',
+    'user.domain',
+    'host.hostname',
+    'host.os.name',
+    'kibana.alert.rule.uuid',
+    'kibana.alert.rule.name',
+    'kibana.alert.rule.parameters.*'
+]
+
+# Slice count used when the shard layout cannot be read (e.g. no 'monitor' privilege)
+DEFAULT_SLICE_COUNT = 4
+
+# Response fields needed to page through signals, stripping the rest of the envelope
+SIGNAL_FILTER_PATH = ['hits.hits._id', 'hits.hits._source', 'hits.hits.sort', 'pit_id']
+
+def _build_auth(
+    api_key: Optional[str] = None,
+    username: Optional[str] = None,
+    password: Optional[str] = None
+) -> Dict:
+    """Return client authentication kwargs for either API key or username/password."""
+    if api_key:
+        return {'api_key': api_key}
+    elif username and password:
+        return {'basic_auth': (username, password)}
+    else:
+        raise ValueError("Either API key or username/password must be provided")
+
+def _build_signals_query(days: int) -> Dict:
+    """Build the query matching signals from the last X days."""
+    # Calculate the date range
+    now = datetime.utcnow()
+    date_from = (now - timedelta(days=days)).isoformat()
+
+    return {
+        "bool": {
+            "must": [
+                {"range": {"@timestamp": {"gte": date_from}}}
+            ]
+        }
+    }
+
 class ElasticsearchConnector:
     def __init__(
         self,
@@ -9,7 +61,8 @@ class ElasticsearchConnector:
         api_key: Optional[str] = None,
         username: Optional[str] = None,
         password: Optional[str] = None,
-        verify_ssl: bool = True
+        verify_ssl: bool = True,
+        connections_per_node: int = 32
     ):
         """
         Initialize Elasticsearch connector with either API key or username/password authentication.
@@ -20,81 +73,341 @@ class ElasticsearchConnector:
             username: Username for basic authentication
             password: Password for basic authentication
             verify_ssl: Whether to verify SSL certificates
+            connections_per_node: HTTP connection pool size per node, at least the slice count (default: 32)
         """
         # Configure authentication
-        if api_key:
-            auth = {'api_key': api_key}
-        elif username and password:
-            auth = {'basic_auth': (username, password)}
-        else:
-            raise ValueError("Either API key or username/password must be provided")
+        auth = _build_auth(api_key, username, password)
 
         # Initialize Elasticsearch client
         self.client = Elasticsearch(
             hosts=[host],
             verify_certs=verify_ssl,
+            connections_per_node=connections_per_node,
+            http_compress=True,  # Gzip request and response bodies
+            request_timeout=60,
+            retry_on_timeout=True,
+            max_retries=3,
             **auth
         )
 
-    def get_signals(self, space: str = "default", days: int = 30) -> List[Dict]:
+    def _get_slice_count(self, index_pattern: str) -> int:
         """
-        Retrieve security signals/alerts for the last X days using scroll API.
+        Pick a slice count from the number of primary shards behind an index pattern.
+        
+        Falls back to DEFAULT_SLICE_COUNT when the caller may not read
+        _cat/shards, which requires the 'monitor' cluster privilege.
+        
+        Args:
+            index_pattern: Index pattern to inspect
+        """
+        try:
+            shards = self.client.cat.shards(index=index_pattern, format='json')
+        except ApiError:
+            return DEFAULT_SLICE_COUNT
+        primaries = sum(1 for shard in shards if shard.get('prirep') == 'p')
+        return max(1, min(primaries, 8))
+
+    def _fetch_slice(
+        self,
+        pit_id: str,
+        query: Dict,
+        slice_id: int = 0,
+        max_slices: int = 1,
+        page_size: int = 1000
+    ) -> List[Dict]:
+        """
+        Page through one slice of a point in time with search_after.
+        
+        Args:
+            pit_id: Point in time ID to search
+            query: Query to run against the point in time
+            slice_id: ID of the slice to read
+            max_slices: Total number of slices (1 disables slicing)
+            page_size: Number of documents per page (default: 1000)
+        """
+        search_after = None
+        results = []
+        
+        while True:
+            resp = self.client.search(
+                pit={'id': pit_id, 'keep_alive': '5m'},
+                query=query,
+                size=page_size,
+                sort=[{"@timestamp": {"order": "desc"}}, {"_shard_doc": "asc"}],
+                search_after=search_after,
+                slice={'id': slice_id, 'max': max_slices} if max_slices > 1 else None,
+                track_total_hits=False,  # Skip counting total hits on every page
+                source_includes=SIGNAL_SOURCE_FIELDS,
+                filter_path=SIGNAL_FILTER_PATH
+            )
+            # filter_path drops the hits object entirely when a page is empty
+            hits = resp.get('hits', {}).get('hits', [])
+            results.extend([{
+                'id': hit['_id'],
+                'source': hit['_source']
+            } for hit in hits])
+            
+            # The PIT ID may change between requests, always use the latest one
+            pit_id = resp.get('pit_id', pit_id)
+            
+            # A short page means there is nothing left to fetch
+            if len(hits) < page_size:
+                break
+            
+            search_after = hits[-1]['sort']
+        
+        return results
+
+    def get_signals(
+        self,
+        space: str = "default",
+        days: int = 30,
+        max_slices: Optional[int] = None
+    ) -> List[Dict]:
+        """
+        Retrieve security signals/alerts for the last X days using point in time and search_after.
+        
+        Slices of the point in time are read in parallel threads, each
+        paginating independently with its own search_after.
         
         Args:
             space: Kibana space name (default: 'default')
             days: Number of days to look back (default: 30)
+            max_slices: Number of parallel slices (default: primary shard count, up to 8)
         """
         index_pattern = f".internal.alerts-security.alerts-{space}-*"
+        query = _build_signals_query(days)
+
+        if max_slices is None:
+            max_slices = self._get_slice_count(index_pattern)
+
+        # Open a point in time so all slices see the same consistent snapshot
+        pit = self.client.open_point_in_time(index=index_pattern, keep_alive='5m')
+        results = []
         
-        # Calculate the date range
-        now = datetime.utcnow()
-        date_from = (now - timedelta(days=days)).isoformat()
+        try:
+            with ThreadPoolExecutor(max_workers=max_slices) as executor:
+                futures = [
+                    executor.submit(self._fetch_slice, pit['id'], query, slice_id, max_slices)
+                    for slice_id in range(max_slices)
+                ]
+                for future in futures:
+                    results.extend(future.result())
+        finally:
+            # Close the point in time to free up resources
+            self.client.close_point_in_time(id=pit['id'])
+        
+        # Slices interleave documents, restore newest-first ordering
+        results.sort(key=lambda signal: signal['source'].get('@timestamp', ''), reverse=True)
+        
+        return results
 
+    def get_signal_by_id(self, signal_id: str, space: str = "default") -> Dict:
+        """
+        Retrieve a specific security signal/alert by ID.
+        
+        Args:
+            signal_id: The ID of the signal to retrieve
+            space: Kibana space name (default: 'default')
+        """
+        index_pattern = f".internal.alerts-security.alerts-{space}-*"
+        
         # Build the query
         query = {
             "bool": {
                 "must": [
-                    {"range": {"@timestamp": {"gte": date_from}}}
+                    {"term": {"_id": signal_id}}
                 ]
             }
         }
 
-        # Initialize scroll
-        results = []
-        resp = self.client.search(
+        # Execute the search
+        response = self.client.search(
             index=index_pattern,
-            query=query,
-            scroll='5m',  # Keep the search context alive for 5 minutes
-            size=1000,    # Number of documents per batch
-            sort=[{"@timestamp": {"order": "desc"}}]
+            query=query
         )
+
+        if response['hits']['total']['value'] == 0:
+            raise ValueError(f"Signal with ID {signal_id} not found")
+
+        return {
+            'id': response['hits']['hits'][0]['_id'],
+            'source': response['hits']['hits'][0]['_source']
+        }
+
+class AsyncElasticsearchConnector:
+    def __init__(
+        self,
+        host: str,
+        api_key: Optional[str] = None,
+        username: Optional[str] = None,
+        password: Optional[str] = None,
+        verify_ssl: bool = True,
+        connections_per_node: int = 32
+    ):
+        """
+        Initialize async Elasticsearch connector with either API key or username/password authentication.
+        
+        Args:
+            host: Elasticsearch host URL (e.g., 'https://elasticsearch.example.com')
+            api_key: API key for authentication
+            username: Username for basic authentication
+            password: Password for basic authentication
+            verify_ssl: Whether to verify SSL certificates
+            connections_per_node: HTTP connection pool size per node, at least the slice count (default: 32)
+        """
+        # Configure authentication
+        auth = _build_auth(api_key, username, password)
+
+        # Initialize Elasticsearch client
+        self.client = AsyncElasticsearch(
+            hosts=[host],
+            verify_certs=verify_ssl,
+            connections_per_node=connections_per_node,
+            http_compress=True,  # Gzip request and response bodies
+            request_timeout=60,
+            retry_on_timeout=True,
+            max_retries=3,
+            **auth
+        )
+
+    async def close(self) -> None:
+        """Close the underlying client and its connections."""
+        await self.client.close()
+
+    async def _get_slice_count(self, index_pattern: str) -> int:
+        """
+        Pick a slice count from the number of primary shards behind an index pattern.
+        
+        Falls back to DEFAULT_SLICE_COUNT when the caller may not read
+        _cat/shards, which requires the 'monitor' cluster privilege.
         
-        # Get the scroll ID
-        scroll_id = resp['_scroll_id']
+        Args:
+            index_pattern: Index pattern to inspect
+        """
+        try:
+            shards = await self.client.cat.shards(index=index_pattern, format='json')
+        except ApiError:
+            return DEFAULT_SLICE_COUNT
+        primaries = sum(1 for shard in shards if shard.get('prirep') == 'p')
+        return max(1, min(primaries, 8))
+
+    async def _iter_slice(
+        self,
+        pit_id: str,
+        query: Dict,
+        slice_id: int = 0,
+        max_slices: int = 1,
+        page_size: int = 1000,
+        keep_alive: str = '5m'
+    ) -> AsyncIterator[List[Dict]]:
+        """
+        Page through one slice of a point in time with search_after, yielding each page.
         
-        # Get the first batch of results
-        results.extend([{
-            'id': hit['_id'],
-            'source': hit['_source']
-        } for hit in resp['hits']['hits']])
+        Args:
+            pit_id: Point in time ID to search
+            query: Query to run against the point in time
+            slice_id: ID of the slice to read
+            max_slices: Total number of slices (1 disables slicing)
+            page_size: Number of documents per page (default: 1000)
+            keep_alive: How long the point in time stays open between requests (default: '5m')
+        """
+        search_after = None
         
-        # Continue scrolling until no more hits are returned
-        while len(resp['hits']['hits']):
-            resp = self.client.scroll(
-                scroll_id=scroll_id,
-                scroll='5m'
+        while True:
+            resp = await self.client.search(
+                pit={'id': pit_id, 'keep_alive': keep_alive},
+                query=query,
+                size=page_size,
+                sort=[{"@timestamp": {"order": "desc"}}, {"_shard_doc": "asc"}],
+                search_after=search_after,
+                slice={'id': slice_id, 'max': max_slices} if max_slices > 1 else None,
+                track_total_hits=False,  # Skip counting total hits on every page
+                source_includes=SIGNAL_SOURCE_FIELDS,
+                filter_path=SIGNAL_FILTER_PATH
             )
-            results.extend([{
-                'id': hit['_id'],
-                'source': hit['_source']
-            } for hit in resp['hits']['hits']])
+            # filter_path drops the hits object entirely when a page is empty
+            hits = resp.get('hits', {}).get('hits', [])
+            if hits:
+                yield [{
+                    'id': hit['_id'],
+                    'source': hit['_source']
+                } for hit in hits]
+            
+            # The PIT ID may change between requests, always use the latest one
+            pit_id = resp.get('pit_id', pit_id)
+            
+            # A short page means there is nothing left to fetch
+            if len(hits) < page_size:
+                break
+            
+            search_after = hits[-1]['sort']
+
+    async def iter_signal_pages(
+        self,
+        space: str = "default",
+        days: int = 30,
+        max_slices: Optional[int] = None,
+        keep_alive: str = '5m'
+    ) -> AsyncIterator[List[Dict]]:
+        """
+        Stream security signals/alerts for the last X days page by page.
         
-        # Clear the scroll context to free up resources
-        self.client.clear_scroll(scroll_id=scroll_id)
+        Slices of the point in time are read concurrently and pages are
+        yielded as soon as any slice returns them, in no particular order.
+        Slices are read to the end even when the consumer falls behind, so
+        the point in time never sits idle longer than `keep_alive`.
         
-        return results
+        Args:
+            space: Kibana space name (default: 'default')
+            days: Number of days to look back (default: 30)
+            max_slices: Number of concurrent slices (default: primary shard count, up to 8)
+            keep_alive: How long the point in time stays open between requests (default: '5m')
+        """
+        index_pattern = f".internal.alerts-security.alerts-{space}-*"
+        query = _build_signals_query(days)
 
-    def get_signal_by_id(self, signal_id: str, space: str = "default") -> Dict:
+        if max_slices is None:
+            max_slices = await self._get_slice_count(index_pattern)
+
+        # Open a point in time so all slices see the same consistent snapshot
+        pit = await self.client.open_point_in_time(index=index_pattern, keep_alive=keep_alive)
+        # Unbounded so a slow consumer buffers pages instead of stalling searches past keep_alive
+        pages = asyncio.Queue()
+
+        async def read_slice(slice_id: int) -> None:
+            async for page in self._iter_slice(pit['id'], query, slice_id, max_slices, keep_alive=keep_alive):
+                await pages.put(page)
+
+        async def read_all_slices() -> None:
+            try:
+                await asyncio.gather(*[read_slice(slice_id) for slice_id in range(max_slices)])
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # Still end the stream so the consumer can surface the error
+                await pages.put(None)
+                raise
+            await pages.put(None)
+
+        readers = asyncio.ensure_future(read_all_slices())
+        try:
+            while True:
+                page = await pages.get()
+                if page is None:
+                    break
+                yield page
+            # Surface any error raised by the slice readers
+            await readers
+        finally:
+            readers.cancel()
+            # Close the point in time to free up resources, unless it already expired
+            try:
+                await self.client.close_point_in_time(id=pit['id'])
+            except NotFoundError:
+                pass
+
+    async def get_signal_by_id(self, signal_id: str, space: str = "default") -> Dict:
         """
         Retrieve a specific security signal/alert by ID.
         
@@ -114,7 +427,7 @@ class ElasticsearchConnector:
         }
 
         # Execute the search
-        response = self.client.search(
+        response = await self.client.search(
             index=index_pattern,
             query=query
         )
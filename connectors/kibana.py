@@ -1,11 +1,39 @@
+import asyncio
+import httpx
+import math
 import requests
+from requests.adapters import HTTPAdapter
 from typing import Dict, List, Optional, Union
+from tenacity import retry, retry_if_exception, stop_after_attempt, wait_random_exponential
 from urllib3.exceptions import InsecureRequestWarning
+from urllib3.util.retry import Retry
 
 # Suppress insecure HTTPS warnings
 requests.packages.urllib3.disable_warnings(InsecureRequestWarning)
 
-class KibanaConnector:
+# HTTP statuses that indicate a transient failure worth retrying
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# Statuses returned by Kibana versions without GET /api/note?documentIds=
+UNSUPPORTED_STATUS_CODES = {404, 405}
+
+def _is_transient_error(exc: BaseException) -> bool:
+    """Return True for connection failures and 429/5xx responses."""
+    if isinstance(exc, (requests.ConnectionError, requests.Timeout, httpx.TransportError)):
+        return True
+    if isinstance(exc, (requests.HTTPError, httpx.HTTPStatusError)) and exc.response is not None:
+        return exc.response.status_code in RETRYABLE_STATUS_CODES
+    return False
+
+# Exponential backoff with jitter for transient Kibana API failures
+retry_transient = retry(
+    wait=wait_random_exponential(min=1, max=60),
+    stop=stop_after_attempt(5),
+    retry=retry_if_exception(_is_transient_error),
+    reraise=True
+)
+
+class BaseKibanaConnector:
     def __init__(
         self,
         host: str,
@@ -16,7 +44,7 @@ class KibanaConnector:
         verify_ssl: bool = True
     ):
         """
-        Initialize Kibana connector with either API key or username/password authentication.
+        Initialize Kibana connection settings with either API key or username/password authentication.
         
         Args:
             host: Kibana host URL (e.g., 'https://kibana.example.com')
@@ -38,7 +66,7 @@ class KibanaConnector:
             self.auth = (username, password)
         else:
             raise ValueError("Either API key or username/password must be provided")
-            
+        
         # Set space-aware API endpoint
         self.api_endpoint = (
             f"{self.base_url}/s/{space}/api"
@@ -46,30 +74,74 @@ class KibanaConnector:
             else f"{self.base_url}/api"
         )
 
-    def get_all_detection_rules(self) -> List[Dict]:
-        """Retrieve all detection rules from Kibana."""
+class KibanaConnector(BaseKibanaConnector):
+    def __init__(
+        self,
+        host: str,
+        space: str = "default",
+        api_key: Optional[str] = None,
+        username: Optional[str] = None,
+        password: Optional[str] = None,
+        verify_ssl: bool = True
+    ):
+        """
+        Initialize Kibana connector with either API key or username/password authentication.
+        
+        Args:
+            host: Kibana host URL (e.g., 'https://kibana.example.com')
+            space: Kibana space name (default: 'default')
+            api_key: API key for authentication
+            username: Username for basic authentication
+            password: Password for basic authentication
+            verify_ssl: Whether to verify SSL certificates
+        """
+        super().__init__(host, space, api_key, username, password, verify_ssl)
+        
+        # Reuse one session so TCP/TLS connections are kept alive across calls
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        self.session.verify = verify_ssl
+        if hasattr(self, 'auth'):
+            self.session.auth = self.auth
+        # Retries are handled by retry_transient alone so the two layers don't multiply
+        adapter = HTTPAdapter(
+            pool_connections=32,
+            pool_maxsize=32,
+            max_retries=Retry(0)
+        )
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    @retry_transient
+    def _get_rules_page(self, page: int, per_page: int) -> Dict:
+        """
+        Retrieve one page of detection rules.
+        
+        Args:
+            page: Page number to fetch (1-based)
+            per_page: Number of rules per page
+        """
         url = f"{self.api_endpoint}/detection_engine/rules/_find"
+        params = {
+            'page': page,
+            'per_page': per_page
+        }
         
+        response = self.session.get(
+            url,
+            params=params
+        )
+        response.raise_for_status()
+        return response.json()
+
+    def get_all_detection_rules(self) -> List[Dict]:
+        """Retrieve all detection rules from Kibana, retrying each page on its own."""
         all_rules = []
         page = 1
         per_page = 100  # Increase page size to reduce number of requests
         
         while True:
-            params = {
-                'page': page,
-                'per_page': per_page
-            }
-            
-            response = requests.get(
-                url,
-                headers=self.headers,
-                params=params,
-                verify=self.verify_ssl,
-                auth=getattr(self, 'auth', None)
-            )
-            response.raise_for_status()
-            
-            data = response.json()
+            data = self._get_rules_page(page, per_page)
             rules = data['data']
             all_rules.extend(rules)
             
@@ -82,6 +154,7 @@ class KibanaConnector:
             
         return all_rules
 
+    @retry_transient
     def get_rule(self, rule_id: str) -> Dict:
         """
         Retrieve a specific detection rule by rule_id.
@@ -92,16 +165,14 @@ class KibanaConnector:
         url = f"{self.api_endpoint}/detection_engine/rules"
         params = {'rule_id': rule_id}
         
-        response = requests.get(
+        response = self.session.get(
             url,
-            headers=self.headers,
-            params=params,
-            verify=self.verify_ssl,
-            auth=getattr(self, 'auth', None)
+            params=params
         )
         response.raise_for_status()
         return response.json()
 
+    @retry_transient
     def patch_rule(self, rule_id: str, updates: Dict) -> Dict:
         """
         Update a detection rule using PATCH method.
@@ -116,25 +187,53 @@ class KibanaConnector:
             **updates
         }
 
-        response = requests.patch(
+        response = self.session.patch(
             url,
-            headers=self.headers,
-            json=payload,
-            verify=self.verify_ssl,
-            auth=getattr(self, 'auth', None)
+            json=payload
         )
         response.raise_for_status()
         return response.json()
 
+    def get_notes(self, event_id: str) -> List[Dict]:
+        """
+        Retrieve the notes attached to a specific alert/event in Kibana.
+        
+        Returns an empty list on Kibana versions that do not support
+        listing notes by document ID.
+        
+        Args:
+            event_id: The ID of the alert/event
+        """
+        url = f"{self.api_endpoint}/note"
+        params = {'documentIds': event_id}
+
+        response = self.session.get(
+            url,
+            params=params
+        )
+        if response.status_code in UNSUPPORTED_STATUS_CODES:
+            return []
+        response.raise_for_status()
+        return response.json().get('notes', [])
+
+    @retry_transient
     def add_note(self, event_id: str, note_text: str, timeline_id: str = "") -> Dict:
         """
         Add a note to a specific alert/event in Kibana.
         
+        Skips the write if an identical note already exists, so a retried
+        request does not create a duplicate note. The check is best-effort:
+        on Kibana versions that cannot list notes the note is always written.
+        
         Args:
             event_id: The ID of the alert/event
             note_text: The content of the note to add
             timeline_id: Optional timeline ID (default: empty string)
         """
+        for note in self.get_notes(event_id):
+            if note.get('eventId') == event_id and note.get('note') == note_text:
+                return note
+
         url = f"{self.api_endpoint}/note"
         payload = {
             "note": {
@@ -144,12 +243,184 @@ class KibanaConnector:
             }
         }
 
-        response = requests.patch(
+        response = self.session.patch(
             url,
+            json=payload
+        )
+        response.raise_for_status()
+        return response.json()
+
+class AsyncKibanaConnector(BaseKibanaConnector):
+    def __init__(
+        self,
+        host: str,
+        space: str = "default",
+        api_key: Optional[str] = None,
+        username: Optional[str] = None,
+        password: Optional[str] = None,
+        verify_ssl: bool = True,
+        max_connections: int = 64
+    ):
+        """
+        Initialize async Kibana connector with either API key or username/password authentication.
+        
+        Args:
+            host: Kibana host URL (e.g., 'https://kibana.example.com')
+            space: Kibana space name (default: 'default')
+            api_key: API key for authentication
+            username: Username for basic authentication
+            password: Password for basic authentication
+            verify_ssl: Whether to verify SSL certificates
+            max_connections: Maximum number of pooled connections (default: 64)
+        """
+        super().__init__(host, space, api_key, username, password, verify_ssl)
+        
+        # One shared HTTP/2 client multiplexes concurrent requests over few connections
+        self.aclient = httpx.AsyncClient(
+            http2=True,
             headers=self.headers,
-            json=payload,
-            verify=self.verify_ssl,
-            auth=getattr(self, 'auth', None)
+            auth=getattr(self, 'auth', None),
+            verify=verify_ssl,
+            limits=httpx.Limits(max_connections=max_connections),
+            timeout=httpx.Timeout(30.0)
+        )
+
+    async def aclose(self) -> None:
+        """Close the underlying HTTP client and its connections."""
+        await self.aclient.aclose()
+
+    @retry_transient
+    async def _get_rules_page(self, page: int, per_page: int) -> Dict:
+        """
+        Retrieve one page of detection rules.
+        
+        Args:
+            page: Page number to fetch (1-based)
+            per_page: Number of rules per page
+        """
+        url = f"{self.api_endpoint}/detection_engine/rules/_find"
+        params = {
+            'page': page,
+            'per_page': per_page
+        }
+        
+        response = await self.aclient.get(
+            url,
+            params=params
+        )
+        response.raise_for_status()
+        return response.json()
+
+    async def get_all_detection_rules(self) -> List[Dict]:
+        """Retrieve all detection rules from Kibana, fetching pages concurrently."""
+        per_page = 100  # Increase page size to reduce number of requests
+        
+        # The first page reports the total, which tells us how many pages remain
+        data = await self._get_rules_page(1, per_page)
+        all_rules = list(data['data'])
+        pages = math.ceil(data.get('total', 0) / per_page)
+        
+        # gather() preserves the order of its arguments, so pages stay in order
+        remaining = await asyncio.gather(*[
+            self._get_rules_page(page, per_page) for page in range(2, pages + 1)
+        ])
+        for page_data in remaining:
+            all_rules.extend(page_data['data'])
+            
+        return all_rules
+
+    @retry_transient
+    async def get_rule(self, rule_id: str) -> Dict:
+        """
+        Retrieve a specific detection rule by rule_id.
+        
+        Args:
+            rule_id: The ID of the rule to retrieve
+        """
+        url = f"{self.api_endpoint}/detection_engine/rules"
+        params = {'rule_id': rule_id}
+        
+        response = await self.aclient.get(
+            url,
+            params=params
+        )
+        response.raise_for_status()
+        return response.json()
+
+    @retry_transient
+    async def patch_rule(self, rule_id: str, updates: Dict) -> Dict:
+        """
+        Update a detection rule using PATCH method.
+        
+        Args:
+            rule_id: The ID of the rule to update
+            updates: Dictionary containing the fields to update
+        """
+        url = f"{self.api_endpoint}/detection_engine/rules"
+        payload = {
+            "rule_id": rule_id,
+            **updates
+        }
+
+        response = await self.aclient.patch(
+            url,
+            json=payload
+        )
+        response.raise_for_status()
+        return response.json()
+
+    async def get_notes(self, event_id: str) -> List[Dict]:
+        """
+        Retrieve the notes attached to a specific alert/event in Kibana.
+        
+        Returns an empty list on Kibana versions that do not support
+        listing notes by document ID.
+        
+        Args:
+            event_id: The ID of the alert/event
+        """
+        url = f"{self.api_endpoint}/note"
+        params = {'documentIds': event_id}
+
+        response = await self.aclient.get(
+            url,
+            params=params
+        )
+        if response.status_code in UNSUPPORTED_STATUS_CODES:
+            return []
+        response.raise_for_status()
+        return response.json().get('notes', [])
+
+    @retry_transient
+    async def add_note(self, event_id: str, note_text: str, timeline_id: str = "") -> Dict:
+        """
+        Add a note to a specific alert/event in Kibana.
+        
+        Skips the write if an identical note already exists, so a retried
+        request does not create a duplicate note. The check is best-effort:
+        on Kibana versions that cannot list notes the note is always written.
+        
+        Args:
+            event_id: The ID of the alert/event
+            note_text: The content of the note to add
+            timeline_id: Optional timeline ID (default: empty string)
+        """
+        for note in await self.get_notes(event_id):
+            if note.get('eventId') == event_id and note.get('note') == note_text:
+                return note
+
+        url = f"{self.api_endpoint}/note"
+        payload = {
+            "note": {
+                "timelineId": timeline_id,
+                "eventId": event_id,
+                "note": note_text
+            }
+        }
+
+        response = await self.aclient.patch(
+            url,
+            json=payload
         )
         response.raise_for_status()
         return response.json()
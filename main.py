@@ -1,58 +1,284 @@
 from dotenv import load_dotenv
+import argparse
+import asyncio
 import os
-from connectors.kibana import KibanaConnector
-from connectors.elasticsearch import ElasticsearchConnector
-from connectors.ai import AISecurityAnalyst
+from connectors.kibana import AsyncKibanaConnector
+from connectors.elasticsearch import AsyncElasticsearchConnector
+from collections import defaultdict
+from connectors.ai import AISecurityAnalyst, signal_fingerprint
 
 # Load environment variables
 load_dotenv()
-kibana = KibanaConnector(
-    host=os.getenv('KIBANA_URL'),
-    space='soc',
-    username=os.getenv('ELASTIC_USERNAME'),
-    password=os.getenv('ELASTIC_PASSWORD'),
-    verify_ssl=False 
-)
-elastic = ElasticsearchConnector(
-    host=os.getenv('ELASTIC_URL'),
-    username=os.getenv('ELASTIC_USERNAME'),
-    password=os.getenv('ELASTIC_PASSWORD'),
-    verify_ssl=False
-)
-ai_analyst = AISecurityAnalyst(
-    openai_api_key=os.getenv('OPENAI_API_KEY'),
-    model="gpt-4o"
-)
-
-def main():
-    rules = kibana.get_all_detection_rules()
-    print(f"Found {len(rules)} rules")
-    
-    signals = elastic.get_signals(space='soc', days=30)
+
+# Number of workers analyzing and noting signals concurrently
+NUM_WORKERS = 50
+# Maximum number of fetched signals waiting for a worker
+QUEUE_SIZE = 200
+# Signals packed into one live request in --urgent mode, 1 for one request per signal
+BATCH_SIZE = 5
+# Signals with the same rule, host, command line and user within this window share one analysis
+DEDUP_WINDOW_MINUTES = 15
+# Slices page newest first, so shared analyses this many windows newer than any signal
+# being analyzed are dropped; a duplicate arriving later is simply analyzed again
+DEDUP_RETAIN_BUCKETS = 4
+
+async def add_analysis_note(kibana, signal, analysis):
+    """Format an AI analysis and add it as a note to the signal's alert."""
+    shared_from = (
+        f"\n    Shared From Signal: {analysis['shared_from']} (same activity within {DEDUP_WINDOW_MINUTES} minutes)"
+        if 'shared_from' in analysis
+        else ""
+    )
+    # Format the note with AI analysis
+    note_text = f"""
+    AI Security Analysis            
+
+    {analysis['triage'].to_markdown()}
+
+    Signal ID: {signal['id']}{shared_from}
+    Analysis Timestamp: {analysis['timestamp']}
+    Model Used: {analysis['model_used']}
+    """
+    # Add the analysis as a note to the alert
+    await kibana.add_note(event_id=signal['id'], note_text=note_text)
+
+def reuse_analysis(analysis, signal):
+    """Return a copy of a group representative's analysis attributed to another signal."""
+    if analysis['signal_id'] == signal['id']:
+        return analysis
+    return dict(
+        analysis,
+        signal_id=signal['id'],
+        timestamp=signal['source'].get('@timestamp'),
+        shared_from=analysis.get('shared_from', analysis['signal_id'])
+    )
+
+def evict_past_buckets(analyses, bucket):
+    """Drop shared analyses of time buckets well past the newest bucket being analyzed."""
+    # Buckets of unparseable timestamps are strings and are kept
+    for past in [past for past in analyses if isinstance(past, int) and past > bucket + DEDUP_RETAIN_BUCKETS]:
+        del analyses[past]
+
+async def analyze_deduplicated(ai_analyst, signals, analyses):
+    """
+    Analyze signals, sharing one analysis among signals with the same fingerprint.
+    
+    The first signal of each group is analyzed, up to BATCH_SIZE per request,
+    while later ones wait for their group's result. If that analysis fails,
+    the waiting signals are analyzed on their own.
+    
+    Returns analyses in the same order as `signals`, or the exception raised for a signal.
+    """
+    loop = asyncio.get_running_loop()
+    keys = [signal_fingerprint(signal, DEDUP_WINDOW_MINUTES) for signal in signals]
+    buckets = [key[-1] for key in keys if key is not None and isinstance(key[-1], int)]
+    if buckets:
+        evict_past_buckets(analyses, max(buckets))
+    
+    # Index of each signal analyzed here -> its group and fingerprint (None if never shared)
+    leaders = {}
+    futures = []
+    for index, key in enumerate(keys):
+        if key is None:
+            leaders[index] = (None, None)
+            futures.append(loop.create_future())
+            continue
+        group = analyses[key[-1]]
+        if key not in group:
+            group[key] = loop.create_future()
+            leaders[index] = (group, key)
+        futures.append(group[key])
+    
+    results = dict(zip(
+        leaders,
+        await ai_analyst.analyze_signals_batch([signals[index] for index in leaders], batch_size=BATCH_SIZE)
+    ))
+    for index, result in results.items():
+        group, key = leaders[index]
+        if isinstance(result, Exception):
+            # Waiting signals fall back to their own analysis
+            if group is not None:
+                group.pop(key, None)
+            futures[index].set_result(None)
+        else:
+            futures[index].set_result(result)
+    
+    async def resolve(index, signal, future):
+        if index in results:
+            return results[index]
+        analysis = await future
+        if analysis is not None:
+            return reuse_analysis(analysis, signal)
+        return await ai_analyst.analyze_signal(signal)
+    
+    return await asyncio.gather(
+        *[resolve(index, signal, future) for index, (signal, future) in enumerate(zip(signals, futures))],
+        return_exceptions=True
+    )
+
+async def process_signals(kibana, ai_analyst, signals, analyses):
+    """Analyze signals together and add each analysis as a note to its signal."""
+    analyses_by_signal = await analyze_deduplicated(ai_analyst, signals, analyses)
+    
+    async def note_signal(signal, analysis):
+        try:
+            if isinstance(analysis, Exception):
+                raise analysis
+            await add_analysis_note(kibana, signal, analysis)
+            print(f"✓ Processed signal {signal['id']}")
+        except Exception as e:
+            print(f"✗ Error processing signal {signal['id']}: {str(e)}")
+    
+    await asyncio.gather(*[
+        note_signal(signal, analysis) for signal, analysis in zip(signals, analyses_by_signal)
+    ])
+
+async def produce_signals(elastic, queue: asyncio.Queue) -> int:
+    """Stream signals from Elasticsearch into the queue page by page, returning the count."""
+    count = 0
+    async for page in elastic.iter_signal_pages(space='soc', days=30):
+        for signal in page:
+            # Blocks while the queue is full, so fetching never runs far ahead of analysis
+            await queue.put(signal)
+        count += len(page)
+    return count
+
+async def worker(kibana, ai_analyst, queue: asyncio.Queue, analyses) -> None:
+    """Process signals from the queue, up to BATCH_SIZE at a time, until the end-of-stream sentinel arrives."""
+    while True:
+        signals = [await queue.get()]
+        # Take what is already queued rather than waiting for a full batch
+        while len(signals) < BATCH_SIZE and signals[-1] is not None and not queue.empty():
+            signals.append(queue.get_nowait())
+        done = signals[-1] is None
+        if done:
+            signals.pop()
+        if signals:
+            await process_signals(kibana, ai_analyst, signals, analyses)
+        if done:
+            return
+
+async def run_pipeline(kibana, elastic, ai_analyst) -> None:
+    """Analyze signals with live API calls, overlapping ES paging, AI analysis and Kibana writes."""
+    queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+    # Time bucket -> fingerprint -> future resolving to the analysis shared by duplicate signals
+    analyses = defaultdict(dict)
+    workers = [asyncio.create_task(worker(kibana, ai_analyst, queue, analyses)) for _ in range(NUM_WORKERS)]
+    try:
+        count = await produce_signals(elastic, queue)
+    finally:
+        # One sentinel per worker stops them once the queue drains
+        for _ in workers:
+            await queue.put(None)
+        await asyncio.gather(*workers)
+    print(f"Found {count} signals")
+
+async def run_batch(kibana, elastic, ai_analyst) -> None:
+    """Analyze signals through the OpenAI Batch API and add notes once the batch completes."""
+    signals = [signal async for page in elastic.iter_signal_pages(space='soc', days=30) for signal in page]
     print(f"Found {len(signals)} signals")
+    if not signals:
+        return
     
-    # Process each signal with AI analysis
+    # Batches submitted by an interrupted run are collected instead of submitted again
+    open_batches = ai_analyst.get_open_batches()
+    submitted = {signal_id for signal_ids in open_batches.values() for signal_id in signal_ids}
+    
+    # Analyze one representative per group of duplicate signals, preferring one already submitted
+    groups = defaultdict(list)
     for signal in signals:
+        # Signals without a fingerprint form a group of their own
+        groups[signal_fingerprint(signal, DEDUP_WINDOW_MINUTES) or signal['id']].append(signal)
+    representatives = {}
+    unique_signals = []
+    for members in groups.values():
+        representative = next((signal for signal in members if signal['id'] in submitted), members[0])
+        unique_signals.append(representative)
+        for signal in members:
+            representatives[signal['id']] = representative
+    print(f"Analyzing {len(unique_signals)} unique signals")
+    
+    # Reuse cached analyses so reruns only submit new signals
+    results = await ai_analyst.get_cached_analyses(unique_signals)
+    pending = [
+        signal for signal in unique_signals
+        if signal['id'] not in results and signal['id'] not in submitted
+    ]
+    print(f"Reusing {len(results)} cached analyses, submitting {len(pending)} signals")
+    
+    batch_ids = list(open_batches)
+    if batch_ids:
+        print(f"Resuming batches {', '.join(batch_ids)}")
+    if pending:
+        new_batch_ids = await ai_analyst.submit_batch(pending)
+        print(f"Submitted batches {', '.join(new_batch_ids)}")
+        batch_ids += new_batch_ids
+    if batch_ids:
+        print("Waiting for batches to complete")
+        batches = await asyncio.gather(*[ai_analyst.wait_for_batch(batch_id) for batch_id in batch_ids])
+        for batch in batches:
+            print(f"Batch {batch.id} {batch.status}")
+            results.update(await ai_analyst.get_batch_results(batch, unique_signals))
+    
+    semaphore = asyncio.Semaphore(NUM_WORKERS)
+    
+    async def note_signal(signal):
         try:
-            # Get AI analysis
-            analysis = ai_analyst.analyze_signal(signal)
-            
-            # Format the note with AI analysis
-            note_text = f"""
-            AI Security Analysis            
-
-            {analysis['analysis']}
-
-            Signal ID: {signal['id']}
-            Analysis Timestamp: {analysis['timestamp']}
-            Model Used: {analysis['model_used']}
-            """
-            # Add the analysis as a note to the alert
-            kibana.add_note(event_id=signal['id'], note_text=note_text)
+            representative = representatives[signal['id']]
+            if representative['id'] not in results:
+                raise RuntimeError("no analysis returned by batch")
+            analysis = reuse_analysis(results[representative['id']], signal)
+            async with semaphore:
+                await add_analysis_note(kibana, signal, analysis)
             print(f"✓ Processed signal {signal['id']}")
-            
         except Exception as e:
             print(f"✗ Error processing signal {signal['id']}: {str(e)}")
+    
+    await asyncio.gather(*[note_signal(signal) for signal in signals])
+
+async def main(urgent: bool = False):
+    # Clients are built here rather than at import time so that processes
+    # re-importing this module (e.g. spawned pool workers) don't open their own
+    kibana = AsyncKibanaConnector(
+        host=os.getenv('KIBANA_URL'),
+        space='soc',
+        username=os.getenv('ELASTIC_USERNAME'),
+        password=os.getenv('ELASTIC_PASSWORD'),
+        verify_ssl=False 
+    )
+    elastic = AsyncElasticsearchConnector(
+        host=os.getenv('ELASTIC_URL'),
+        username=os.getenv('ELASTIC_USERNAME'),
+        password=os.getenv('ELASTIC_PASSWORD'),
+        verify_ssl=False
+    )
+    # Rate limits should match the OpenAI account tier; the defaults suit the lowest tiers
+    ai_analyst = AISecurityAnalyst(
+        openai_api_key=os.getenv('OPENAI_API_KEY'),
+        model="gpt-4o",
+        max_tokens=int(os.getenv('OPENAI_MAX_TOKENS', '2048')),
+        requests_per_minute=int(os.getenv('OPENAI_REQUESTS_PER_MINUTE', '500')),
+        tokens_per_minute=int(os.getenv('OPENAI_TOKENS_PER_MINUTE', '30000'))
+    )
+    try:
+        rules = await kibana.get_all_detection_rules()
+        print(f"Found {len(rules)} rules")
+        
+        if urgent:
+            await run_pipeline(kibana, elastic, ai_analyst)
+        else:
+            await run_batch(kibana, elastic, ai_analyst)
+    finally:
+        await kibana.aclose()
+        await elastic.close()
+        ai_analyst.close()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="AI triage of Elastic Security alerts")
+    parser.add_argument(
+        '--urgent',
+        action='store_true',
+        help="analyze with live API calls instead of the cheaper, slower Batch API"
+    )
+    args = parser.parse_args()
+    asyncio.run(main(urgent=args.urgent))
\ No newline at end of file